@@ -1,11 +1,13 @@
 import azure.functions as func
+import asyncio
 import logging
-import json
 import os
+import orjson
 from utils.document_analyzer import DocumentAnalyzerImproved
 from utils.data_processor import ESGDataProcessor
 from typing import Optional
 import traceback
+import uuid
 
 # Configure logging
 logging.basicConfig(
@@ -16,6 +18,18 @@ logging.basicConfig(
 # Initialize the function app
 app = func.FunctionApp()
 
+# Compact JSON output unless pretty-printing is explicitly enabled
+JSON_OPTIONS = orjson.OPT_INDENT_2 if os.environ.get("PRETTY_JSON", "false").lower() == "true" else 0
+
+# Base error payload, copied and filled in per invocation
+ERROR_TEMPLATE = {
+    "status": "error",
+    "filename": None,
+    "correlation_id": None,
+    "error": None,
+    "details": None
+}
+
 # Global initialization for better performance
 doc_analyzer: Optional[DocumentAnalyzerImproved] = None
 data_processor: Optional[ESGDataProcessor] = None
@@ -43,7 +57,7 @@ def get_analyzers():
     path="output-files/{name}.json",
     connection="AzureWebJobsStorage"
 )
-def process_esg_excel(inputblob: func.InputStream, outputblob: func.Out[str]) -> None:
+async def process_esg_excel(inputblob: func.InputStream, outputblob: func.Out[bytes]) -> None:
     """
     Azure Function triggered by blob upload to process ESG Excel files.
     
@@ -52,7 +66,6 @@ def process_esg_excel(inputblob: func.InputStream, outputblob: func.Out[str]) ->
         outputblob: Output JSON file to blob storage
     """
     # Create correlation ID for tracking
-    import uuid
     correlation_id = str(uuid.uuid4())
     
     logging.info(f"[{correlation_id}] Processing ESG Excel file: {inputblob.name}")
@@ -60,11 +73,9 @@ def process_esg_excel(inputblob: func.InputStream, outputblob: func.Out[str]) ->
     
     # Initialize error output
     error_output = {
-        "status": "error",
+        **ERROR_TEMPLATE,
         "filename": inputblob.name,
-        "correlation_id": correlation_id,
-        "error": None,
-        "details": None
+        "correlation_id": correlation_id
     }
     
     try:
@@ -75,7 +86,7 @@ def process_esg_excel(inputblob: func.InputStream, outputblob: func.Out[str]) ->
         excel_content = inputblob.read()
         
         # Analyze document with Azure AI Document Intelligence
-        extracted_data = doc_analyzer.analyze_excel(
+        extracted_data = await doc_analyzer.analyze_excel(
             excel_content, 
             inputblob.name
         )
@@ -85,8 +96,8 @@ def process_esg_excel(inputblob: func.InputStream, outputblob: func.Out[str]) ->
                     f"Tables: {len(extracted_data.get('tables', []))}, "
                     f"KV Pairs: {len(extracted_data.get('key_value_pairs', []))}")
         
-        # Process and structure ESG data
-        esg_data = data_processor.process_esg_data(extracted_data)
+        # Process and structure ESG data (CPU-bound, so off the event loop)
+        esg_data = await asyncio.to_thread(data_processor.process_esg_data, extracted_data)
         
         # Add processing metadata
         esg_data["processing_metadata"] = {
@@ -97,8 +108,8 @@ def process_esg_excel(inputblob: func.InputStream, outputblob: func.Out[str]) ->
             "document_intelligence_metadata": extracted_data.get("metadata", {})
         }
         
-        # Convert to JSON and save
-        output_json = json.dumps(esg_data, indent=2, ensure_ascii=False)
+        # Convert to JSON off the event loop and save
+        output_json = await asyncio.to_thread(orjson.dumps, esg_data, option=JSON_OPTIONS)
         outputblob.set(output_json)
         
         logging.info(f"[{correlation_id}] Successfully processed {inputblob.name}. "
@@ -109,7 +120,7 @@ def process_esg_excel(inputblob: func.InputStream, outputblob: func.Out[str]) ->
         error_output["error"] = "Validation Error"
         error_output["details"] = str(ve)
         logging.error(f"[{correlation_id}] Validation error: {str(ve)}")
-        outputblob.set(json.dumps(error_output, indent=2))
+        outputblob.set(orjson.dumps(error_output, option=JSON_OPTIONS))
         
     except Exception as e:
         # Unexpected errors
@@ -121,7 +132,7 @@ def process_esg_excel(inputblob: func.InputStream, outputblob: func.Out[str]) ->
         logging.error(f"[{correlation_id}] Traceback: {traceback.format_exc()}")
         
         # Save error output
-        outputblob.set(json.dumps(error_output, indent=2))
+        outputblob.set(orjson.dumps(error_output, option=JSON_OPTIONS))
         
         # Re-raise to mark function execution as failed
         raise
\ No newline at end of file
@@ -1,8 +1,8 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-@dataclass
+@dataclass(slots=True)
 class ESGMetric:
     """Represents a single ESG metric."""
     category: str  # 'environmental', 'social', or 'governance'
@@ -16,9 +16,18 @@ class ESGMetric:
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary."""
-        return asdict(self)
+        return {
+            "category": self.category,
+            "metric_name": self.metric_name,
+            "value": self.value,
+            "unit": self.unit,
+            "year": self.year,
+            "source_table": self.source_table,
+            "source_page": self.source_page,
+            "confidence": self.confidence
+        }
 
-@dataclass
+@dataclass(slots=True)
 class ESGReport:
     """Represents a complete ESG report."""
     filename: str
@@ -28,11 +37,15 @@ class ESGReport:
     metadata: Optional[Dict[str, Any]] = None
     
     def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary format."""
+        """Convert to dictionary format.
+        
+        Metrics are kept as ESGMetric instances; orjson serializes
+        dataclasses natively when the report is written out.
+        """
         return {
             "filename": self.filename,
             "extraction_date": self.extraction_date,
-            "metrics": [metric.to_dict() for metric in self.metrics],
+            "metrics": self.metrics,
             "summary": self.summary,
             "metadata": self.metadata
         }
\ No newline at end of file
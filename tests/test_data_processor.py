@@ -0,0 +1,38 @@
+import pytest
+from utils.data_processor import ESGDataProcessor
+
+
+@pytest.fixture
+def processor():
+    return ESGDataProcessor()
+
+
+@pytest.mark.parametrize("value_str, expected", [
+    ("12,345 tCO2", (12345.0, "tCO")),
+    ("$1,200", (1200.0, None)),
+    ("12\u00a0000 t", (12000.0, "t")),
+    ("12 000 t", (12.0, None)),
+    ("5 kWh per year", (5.0, "kWh")),
+    ("1,200 metric tons", (1200.0, "metric")),
+    ("2023 2024", (2023.0, None)),
+    ("5 2023", (5.0, None)),
+    ("12 2023", (12.0, None)),
+    ("1 2023 t", (1.0, None)),
+    ("3 100%", (3.0, None)),
+    ("n/a", None),
+    ("", None),
+])
+def test_parse_value(processor, value_str, expected):
+    assert processor._parse_value(value_str) == expected
+
+
+@pytest.mark.parametrize("content, expected", [
+    ("Energy: 100 kWh, Water: 50 m3.", [("Energy", 100.0, "kWh"), ("Water", 50.0, "m")]),
+    ("# Report\n\n| Metric | Value |\n|---|---|\n| Carbon | 5 |\n\nEmployee count: 300",
+     [("Employee count", 300.0, None)]),
+    ("Water usage: 3.5 ML! Board independence: 80%", [("Water usage", 3.5, "ML"), ("Board independence", 80.0, "%")]),
+    ("x" * 32000, []),
+])
+def test_analyze_content(processor, content, expected):
+    metrics = processor._analyze_content(content)
+    assert [(m.metric_name, m.value, m.unit) for m in metrics] == expected
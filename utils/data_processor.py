@@ -1,9 +1,24 @@
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, List, Tuple
 from datetime import datetime
+import math
 import re
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
+from operator import attrgetter
+import ahocorasick
 from models.esg_models import ESGMetric, ESGReport
 
+def _build_keyword_automaton(esg_keywords: Dict[str, List[str]]) -> ahocorasick.Automaton:
+    """Build an Aho-Corasick automaton over all ESG keywords."""
+    automaton = ahocorasick.Automaton()
+    for priority, (category, keywords) in enumerate(esg_keywords.items()):
+        for keyword in keywords:
+            automaton.add_word(keyword, (priority, category, len(keyword)))
+    automaton.make_automaton()
+    return automaton
+
 class ESGDataProcessor:
     """Processes extracted data to identify and structure ESG metrics."""
     
@@ -26,19 +41,30 @@ class ESGDataProcessor:
         ]
     }
     
+    # ": value unit" after a metric name. Matching starts at the colon so the
+    # search stays linear; the name is recovered back to the previous separator.
+    _CONTENT_VALUE_RX = re.compile(r':\s*([0-9][0-9,]*(?:\.[0-9]+)?)[ \t]*([a-zA-Z%]*)')
+    # Name characters, matched against the reversed text before the colon
+    _REVERSED_NAME_RX = re.compile(r'[^.!?:\n,;]*')
+    
+    # Leading number with an optional unit
+    _VALUE_RX = re.compile(r'([0-9.]+)\s*([a-zA-Z%]*)')
+    # Thousands separators and currency formatting removed before matching
+    _STRIP_TABLE = str.maketrans('', '', ',$\u00a0')
+    
+    # Every keyword hit needs one of these characters in the text
+    _KEYWORD_FIRST_CHARS = frozenset(keyword[0] for keywords in ESG_KEYWORDS.values() for keyword in keywords)
+    
+    # Longest text whose categorization is memoized
+    _MAX_CACHED_TEXT_LENGTH = 64
+    
+    # Keyword automaton shared by all instances, built at import time
+    _AUTOMATON = _build_keyword_automaton(ESG_KEYWORDS)
+    
     def __init__(self):
         """Initialize the ESG data processor."""
-        self.metric_patterns = self._compile_patterns()
-    
-    def _compile_patterns(self) -> Dict[str, List[re.Pattern]]:
-        """Compile regex patterns for ESG metrics identification."""
-        patterns = {}
-        for category, keywords in self.ESG_KEYWORDS.items():
-            patterns[category] = [
-                re.compile(rf'\b{keyword}\b', re.IGNORECASE) 
-                for keyword in keywords
-            ]
-        return patterns
+        # Short labels and headers repeat across cells, so memoize their scans per instance
+        self._scan_keywords_cached = lru_cache(maxsize=8192)(self._scan_keywords)
     
     def process_esg_data(self, extracted_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -52,31 +78,22 @@ class ESGDataProcessor:
         """
         logging.info("Processing ESG data")
         
+        # Metrics from tables, key-value pairs and free text content, in that order
+        table_metrics = (
+            metric
+            for table_idx, table in enumerate(extracted_data.get("tables", []))
+            for metric in self._extract_metrics_from_table(table, table_idx)
+        )
+        kvp_metrics = filter(None, map(self._process_key_value_pair, extracted_data.get("key_value_pairs", [])))
+        content_metrics = self._analyze_content(extracted_data.get("content", ""))
+        
         # Initialize ESG report
         esg_report = ESGReport(
             filename=extracted_data.get("filename", ""),
             extraction_date=datetime.utcnow().isoformat(),
-            metrics=[]
+            metrics=self._deduplicate_metrics(chain(table_metrics, kvp_metrics, content_metrics))
         )
         
-        # Process tables to find ESG metrics
-        if "tables" in extracted_data:
-            for table_idx, table in enumerate(extracted_data["tables"]):
-                metrics = self._extract_metrics_from_table(table, table_idx)
-                esg_report.metrics.extend(metrics)
-        
-        # Process key-value pairs
-        if "key_value_pairs" in extracted_data:
-            for kvp in extracted_data["key_value_pairs"]:
-                metric = self._process_key_value_pair(kvp)
-                if metric:
-                    esg_report.metrics.append(metric)
-        
-        # Analyze content for additional metrics
-        if "content" in extracted_data:
-            content_metrics = self._analyze_content(extracted_data["content"])
-            esg_report.metrics.extend(content_metrics)
-        
         # Calculate summary statistics
         esg_report.summary = self._calculate_summary(esg_report.metrics)
         
@@ -86,53 +103,34 @@ class ESGDataProcessor:
         """Extract ESG metrics from a table."""
         metrics = []
         
-        # Organize cells by row
-        rows = {}
-        for cell in table.get("cells", []):
-            row_idx = cell["row_index"]
-            col_idx = cell["column_index"]
+        # Walk each data row right to left, carrying the nearest parseable
+        # value to the right of the current cell
+        for row in table.get("grid", [])[1:]:  # Skip header row
+            row_metrics = []
+            next_value = None
             
-            if row_idx not in rows:
-                rows[row_idx] = {}
-            rows[row_idx][col_idx] = cell["content"]
-        
-        # Check if first row contains headers
-        headers = rows.get(0, {})
-        
-        # Process data rows
-        for row_idx in sorted(rows.keys()):
-            if row_idx == 0:  # Skip header row
-                continue
+            for content in reversed(row):
+                if not content:
+                    continue
+                
+                category = self._categorize_text(content)
+                if category and next_value is not None:
+                    metric_value, unit = next_value
+                    metric = ESGMetric(
+                        category=category,
+                        metric_name=content,
+                        value=metric_value,
+                        unit=unit,
+                        source_table=table_idx,
+                        confidence=0.8  # Default confidence for table data
+                    )
+                    row_metrics.append(metric)
                 
-            row_data = rows[row_idx]
+                parsed = self._parse_value(content)
+                if parsed:
+                    next_value = parsed
             
-            # Try to identify ESG metrics in the row
-            for col_idx, value in row_data.items():
-                # Check if this might be a metric name
-                category = self._categorize_text(value)
-                if category:
-                    # Look for associated values
-                    metric_value = None
-                    unit = None
-                    
-                    # Check adjacent cells for numeric values
-                    for adj_col in range(col_idx + 1, max(row_data.keys()) + 1):
-                        if adj_col in row_data:
-                            parsed = self._parse_value(row_data[adj_col])
-                            if parsed:
-                                metric_value, unit = parsed
-                                break
-                    
-                    if metric_value is not None:
-                        metric = ESGMetric(
-                            category=category,
-                            metric_name=value,
-                            value=metric_value,
-                            unit=unit,
-                            source_table=table_idx,
-                            confidence=0.8  # Default confidence for table data
-                        )
-                        metrics.append(metric)
+            metrics.extend(reversed(row_metrics))
         
         return metrics
     
@@ -161,34 +159,33 @@ class ESGDataProcessor:
         """Analyze free text content for ESG metrics."""
         metrics = []
         
-        # Split content into sentences
-        sentences = re.split(r'[.!?]+', content)
-        
-        for sentence in sentences:
-            # Look for patterns like "X metric: Y value"
-            match = re.search(r'([^:]+):\s*([0-9,.\s]+)([a-zA-Z%]*)', sentence)
-            if match:
-                metric_name = match.group(1).strip()
-                value_str = match.group(2).strip()
-                unit = match.group(3).strip()
-                
-                category = self._categorize_text(metric_name)
-                if category:
-                    try:
-                        value = float(value_str.replace(',', ''))
-                        metric = ESGMetric(
-                            category=category,
-                            metric_name=metric_name,
-                            value=value,
-                            unit=unit or None,
-                            confidence=0.6  # Lower confidence for content extraction
-                        )
-                        metrics.append(metric)
-                    except ValueError:
-                        pass
+        for metric_name, value_str, unit in self._find_content_metrics(content):
+            category = self._categorize_text(metric_name)
+            if category:
+                metric = ESGMetric(
+                    category=category,
+                    metric_name=metric_name,
+                    value=float(value_str.replace(',', '')),
+                    unit=unit or None,
+                    confidence=0.6  # Lower confidence for content extraction
+                )
+                metrics.append(metric)
         
         return metrics
     
+    def _find_content_metrics(self, content: str) -> Iterator[Tuple[str, str, str]]:
+        """Find "X metric: Y value" patterns, yielding (name, value, unit) strings."""
+        name_floor = 0
+        
+        for match in self._CONTENT_VALUE_RX.finditer(content):
+            # The name runs back to the nearest separator, but never into the previous match
+            reversed_prefix = content[name_floor:match.start()][::-1]
+            metric_name = self._REVERSED_NAME_RX.match(reversed_prefix).group()[::-1].strip()
+            name_floor = match.end()
+            
+            if metric_name:
+                yield metric_name, match.group(1), match.group(2)
+    
     def _categorize_text(self, text: str) -> str:
         """Categorize text as E, S, or G based on keywords."""
         if not text:
@@ -196,23 +193,49 @@ class ESGDataProcessor:
             
         text_lower = text.lower()
         
-        for category, patterns in self.metric_patterns.items():
-            for pattern in patterns:
-                if pattern.search(text_lower):
-                    return category
+        # Cheap reject for strings (mostly numbers) that cannot hold a keyword
+        if self._KEYWORD_FIRST_CHARS.isdisjoint(text_lower):
+            return None
         
-        return None
+        # Only short candidates go through the worker-lifetime cache
+        if len(text_lower) > self._MAX_CACHED_TEXT_LENGTH:
+            return self._scan_keywords(text_lower)
+        return self._scan_keywords_cached(text_lower)
+    
+    def _scan_keywords(self, text_lower: str) -> str:
+        """Find the ESG category of the first-priority whole-word keyword in lowercased text."""
+        best = None
+        
+        # Keep only whole-word hits; the earliest category in ESG_KEYWORDS wins
+        for end_idx, (priority, category, length) in self._AUTOMATON.iter(text_lower):
+            if best is not None and priority >= best[0]:
+                continue
+            start_idx = end_idx - length + 1
+            if start_idx > 0 and self._is_word_char(text_lower[start_idx - 1]):
+                continue
+            if end_idx + 1 < len(text_lower) and self._is_word_char(text_lower[end_idx + 1]):
+                continue
+            best = (priority, category)
+            if priority == 0:
+                break
+        
+        return best[1] if best else None
+    
+    @staticmethod
+    def _is_word_char(char: str) -> bool:
+        """Check whether a character counts as a word character, like regex \\w."""
+        return char.isalnum() or char == '_'
     
     def _parse_value(self, value_str: str) -> tuple:
         """Parse a value string to extract numeric value and unit."""
         if not value_str:
             return None
             
-        # Remove common formatting
-        value_str = value_str.strip().replace(',', '')
+        # Remove common formatting (separators, currency) in one pass
+        value_str = value_str.strip().translate(self._STRIP_TABLE)
         
         # Try to extract number and unit
-        match = re.match(r'([0-9.]+)\s*([a-zA-Z%]*)', value_str)
+        match = self._VALUE_RX.match(value_str)
         if match:
             try:
                 value = float(match.group(1))
@@ -223,24 +246,35 @@ class ESGDataProcessor:
         
         return None
     
+    def _deduplicate_metrics(self, metrics: Iterable[ESGMetric]) -> List[ESGMetric]:
+        """Drop key-value pair and content metrics that repeat an earlier metric; table rows are always kept."""
+        seen = set()
+        unique_metrics = []
+        
+        for metric in metrics:
+            key = (metric.category, metric.metric_name.lower(), metric.value, metric.unit)
+            if metric.source_table is None and key in seen:
+                continue
+            seen.add(key)
+            unique_metrics.append(metric)
+        
+        return unique_metrics
+    
     def _calculate_summary(self, metrics: List[ESGMetric]) -> Dict[str, Any]:
         """Calculate summary statistics for ESG metrics."""
+        category_counts = Counter(map(attrgetter("category"), metrics))
+        
         summary = {
             "total_metrics": len(metrics),
             "metrics_by_category": {
-                "environmental": 0,
-                "social": 0,
-                "governance": 0
+                "environmental": category_counts["environmental"],
+                "social": category_counts["social"],
+                "governance": category_counts["governance"]
             },
             "average_confidence": 0.0
         }
         
         if metrics:
-            total_confidence = 0
-            for metric in metrics:
-                summary["metrics_by_category"][metric.category] += 1
-                total_confidence += metric.confidence
-            
-            summary["average_confidence"] = total_confidence / len(metrics)
+            summary["average_confidence"] = math.fsum(map(attrgetter("confidence"), metrics)) / len(metrics)
         
         return summary
\ No newline at end of file
@@ -1,27 +1,45 @@
 import os
 import logging
+import asyncio
+import random
 from azure.core.credentials import AzureKeyCredential
-from azure.identity import DefaultAzureCredential
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import AnalyzeDocumentRequest, ContentFormat
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from azure.identity.aio import DefaultAzureCredential
+from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
+from azure.ai.documentintelligence.models import ContentFormat
 from typing import Dict, Any, List, Optional
 import time
 from functools import wraps
 
-def retry_on_exception(max_retries: int = 3, delay: float = 1.0, backoff: float = 2.0):
-    """Decorator for retrying functions on exception."""
+# Connection-level failures; anything else (e.g. ValueError from validation) is not retried
+RETRYABLE_EXCEPTIONS = (ServiceRequestError, ServiceResponseError)
+
+# HTTP statuses below 500 that are worth retrying (timeout, throttling)
+RETRYABLE_STATUS_CODES = (408, 429)
+
+def is_transient_error(error: Exception, retryable: tuple = RETRYABLE_EXCEPTIONS) -> bool:
+    """Check whether an error is worth retrying."""
+    if isinstance(error, HttpResponseError):
+        status_code = error.status_code
+        return status_code is not None and (status_code in RETRYABLE_STATUS_CODES or status_code >= 500)
+    return isinstance(error, retryable)
+
+def retry_on_exception(max_retries: int = 3, delay: float = 1.0, backoff: float = 2.0,
+                       retryable: tuple = RETRYABLE_EXCEPTIONS):
+    """Decorator for retrying async functions on transient exceptions."""
     def decorator(func):
         @wraps(func)
-        def wrapper(*args, **kwargs):
+        async def wrapper(*args, **kwargs):
             retry_delay = delay
             for attempt in range(max_retries):
                 try:
-                    return func(*args, **kwargs)
+                    return await func(*args, **kwargs)
                 except Exception as e:
-                    if attempt == max_retries - 1:
+                    if attempt == max_retries - 1 or not is_transient_error(e, retryable):
                         raise
-                    logging.warning(f"Attempt {attempt + 1} failed: {str(e)}. Retrying in {retry_delay}s...")
-                    time.sleep(retry_delay)
+                    sleep_for = retry_delay + random.uniform(0, retry_delay * 0.25)
+                    logging.warning(f"Attempt {attempt + 1} failed: {str(e)}. Retrying in {sleep_for:.2f}s...")
+                    await asyncio.sleep(sleep_for)
                     retry_delay *= backoff
             return None
         return wrapper
@@ -56,6 +74,9 @@ class DocumentAnalyzerImproved:
             credential = AzureKeyCredential(api_key)
             logging.info("Using API key for authentication")
         
+        # Per-page line data is not used downstream, so it is opt-in
+        self.include_pages = os.environ.get("INCLUDE_PAGES", "false").lower() == "true"
+        
         self.client = DocumentIntelligenceClient(
             endpoint=endpoint,
             credential=credential
@@ -86,7 +107,7 @@ class DocumentAnalyzerImproved:
         logging.info(f"File validation passed: {filename} ({file_size_mb:.2f}MB)")
     
     @retry_on_exception(max_retries=3, delay=2.0)
-    def analyze_excel(self, excel_content: bytes, filename: str) -> Dict[str, Any]:
+    async def analyze_excel(self, excel_content: bytes, filename: str) -> Dict[str, Any]:
         """
         Analyze Excel file using Document Intelligence with retry logic.
         
@@ -103,19 +124,19 @@ class DocumentAnalyzerImproved:
         logging.info(f"Starting Document Intelligence analysis for {filename}")
         
         try:
-            # Start analysis
-            poller = self.client.begin_analyze_document(
+            # Start analysis, sending the file as the raw request body rather
+            # than a base64-encoded JSON copy
+            poller = await self.client.begin_analyze_document(
                 model_id="prebuilt-layout",
-                analyze_request=AnalyzeDocumentRequest(
-                    bytes_source=excel_content
-                ),
+                analyze_request=excel_content,
+                content_type="application/octet-stream",
                 features=["tables", "keyValuePairs"],
                 output_content_format=ContentFormat.MARKDOWN,
                 locale="en-US"  # Specify locale for better accuracy
             )
             
             # Poll with timeout
-            result = poller.result(timeout=300)  # 5 minute timeout
+            result = await asyncio.wait_for(poller.result(), timeout=300)  # 5 minute timeout
             
             # Extract and structure data
             extracted_data = self._structure_results(result, filename)
@@ -148,7 +169,7 @@ class DocumentAnalyzerImproved:
             extracted_data["content"] = result.content
         
         # Process pages safely
-        if hasattr(result, 'pages'):
+        if self.include_pages and hasattr(result, 'pages'):
             for page in result.pages:
                 try:
                     page_data = self._extract_page_data(page)
@@ -212,31 +233,45 @@ class DocumentAnalyzerImproved:
             "row_count": getattr(table, 'row_count', 0),
             "column_count": getattr(table, 'column_count', 0),
             "cells": [],
-            "headers": []
+            "headers": [],
+            "grid": []  # Cell contents by [row][column], None where no cell starts
         }
         
         if hasattr(table, 'cells'):
-            # Sort cells by position
-            sorted_cells = sorted(
-                table.cells,
-                key=lambda c: (c.row_index, c.column_index)
-            )
+            # Bucket cells by position. The declared size may be missing or too
+            # small, so grow it to cover every cell index.
+            cells = list(table.cells)
+            row_count = max(table_data["row_count"] or 0, max((cell.row_index for cell in cells), default=-1) + 1)
+            column_count = max(table_data["column_count"] or 0, max((cell.column_index for cell in cells), default=-1) + 1)
             
-            for cell in sorted_cells:
-                cell_data = {
-                    "row_index": cell.row_index,
-                    "column_index": cell.column_index,
-                    "content": cell.content.strip() if cell.content else "",
-                    "row_span": getattr(cell, 'row_span', 1),
-                    "column_span": getattr(cell, 'column_span', 1),
-                    "is_header": cell.row_index == 0  # Assume first row is header
-                }
+            positioned = [[None] * column_count for _ in range(row_count)]
+            for cell in cells:
+                positioned[cell.row_index][cell.column_index] = cell
+            
+            for row in positioned:
+                grid_row = [None] * column_count
                 
-                table_data["cells"].append(cell_data)
+                for cell in row:
+                    if cell is None:
+                        continue
+                    
+                    cell_data = {
+                        "row_index": cell.row_index,
+                        "column_index": cell.column_index,
+                        "content": cell.content.strip() if cell.content else "",
+                        "row_span": getattr(cell, 'row_span', 1),
+                        "column_span": getattr(cell, 'column_span', 1),
+                        "is_header": cell.row_index == 0  # Assume first row is header
+                    }
+                    
+                    table_data["cells"].append(cell_data)
+                    grid_row[cell.column_index] = cell_data["content"]
+                    
+                    # Extract headers
+                    if cell_data["is_header"]:
+                        table_data["headers"].append(cell_data["content"])
                 
-                # Extract headers
-                if cell_data["is_header"]:
-                    table_data["headers"].append(cell_data["content"])
+                table_data["grid"].append(grid_row)
         
         return table_data
     